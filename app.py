@@ -11,11 +11,17 @@ através de integração com ChatGPT e Make.com
 """
 
 import os
+import re
+import copy
 import json
+import time
 import logging
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from urllib.parse import quote
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 
@@ -124,6 +130,14 @@ SUBTAREFAS_TEMPLATES = {
     ]
 }
 
+# Cache do estado das tarefas (evita GET antes de cada atualização)
+CACHE_TTL_SEGUNDOS = 300
+CACHE_ESTADO_TAREFAS: Dict[str, Dict[str, Any]] = {}
+_cache_lock = threading.Lock()
+
+# Limite de requisições simultâneas ao ClickUp nas atualizações
+MAX_REQUISICOES_PARALELAS = 5
+
 class ClickUpAPI:
     """Classe para interação com a API do ClickUp"""
     
@@ -145,6 +159,8 @@ class ClickUpAPI:
                 response = requests.post(url, headers=self.headers, json=data, timeout=30)
             elif method.upper() == 'PUT':
                 response = requests.put(url, headers=self.headers, json=data, timeout=30)
+            elif method.upper() == 'DELETE':
+                response = requests.delete(url, headers=self.headers, timeout=30)
             else:
                 return False, {'error': f'Método {method} não suportado'}
             
@@ -156,6 +172,10 @@ class ClickUpAPI:
                 logger.error(f"Erro HTTP {response.status_code}: {response.text}")
                 return False, {'error': f'HTTP {response.status_code}: {response.text}'}
             
+            # DELETE e alguns POSTs retornam corpo vazio
+            if not response.content:
+                return True, {}
+            
             return True, response.json()
             
         except requests.exceptions.Timeout:
@@ -287,8 +307,8 @@ class ClickUpAPI:
         
         return cleaned_data
     
-    def create_checklist(self, task_id: str, checklist_name: str, items: List[str]) -> Tuple[bool, str]:
-        """Cria um checklist na tarefa"""
+    def create_checklist(self, task_id: str, checklist_name: str, items: List[str]) -> Tuple[bool, Dict]:
+        """Cria um checklist na tarefa e retorna seu estado (id, nome e itens criados)"""
         checklist_data = {
             'name': checklist_name
         }
@@ -297,37 +317,158 @@ class ClickUpAPI:
         
         if not success:
             logger.error(f"Erro ao criar checklist: {response}")
-            return False, ""
+            return False, {}
         
-        checklist_id = response['checklist']['id']
+        checklist = {
+            'id': response['checklist']['id'],
+            'name': checklist_name,
+            'items': []
+        }
         
         # Adicionar itens ao checklist
         for item in items:
-            item_data = {
-                'name': item,
-                'assignee': None
-            }
-            
-            success, _ = self._make_request('POST', f"checklist/{checklist_id}/checklist_item", item_data)
-            if not success:
+            success, item_id = self.add_checklist_item(checklist['id'], item)
+            if success:
+                checklist['items'].append({'id': item_id, 'name': item})
+            else:
                 logger.warning(f"Erro ao adicionar item '{item}' ao checklist")
         
-        logger.info(f"Checklist criado com sucesso: {checklist_id}")
+        logger.info(f"Checklist criado com sucesso: {checklist['id']}")
+        return True, checklist
+    
+    def add_checklist_item(self, checklist_id: str, item_name: str) -> Tuple[bool, str]:
+        """Adiciona um item ao checklist e retorna o id do item criado"""
+        item_data = {
+            'name': item_name,
+            'assignee': None
+        }
+        
+        success, response = self._make_request('POST', f"checklist/{checklist_id}/checklist_item", item_data)
+        if not success:
+            logger.error(f"Erro ao adicionar item ao checklist: {response}")
+            return False, ""
+        
+        # A API retorna o checklist completo; o item novo é o último com esse nome
+        items = response.get('checklist', {}).get('items', [])
+        item_ids = [item['id'] for item in items if item.get('name') == item_name]
+        if not item_ids:
+            logger.error(f"Item '{item_name}' não encontrado na resposta do checklist {checklist_id}")
+            return False, ""
+        return True, item_ids[-1]
+    
+    def update_checklist(self, checklist_id: str, checklist_name: str) -> Tuple[bool, str]:
+        """Renomeia um checklist"""
+        success, response = self._make_request('PUT', f"checklist/{checklist_id}", {'name': checklist_name})
+        if not success:
+            logger.error(f"Erro ao renomear checklist: {response}")
+            return False, ""
         return True, checklist_id
     
-    def create_subtask(self, parent_task_id: str, subtask_data: Dict) -> Tuple[bool, str]:
+    def delete_checklist_item(self, checklist_id: str, item_id: str) -> Tuple[bool, str]:
+        """Remove um item do checklist"""
+        success, response = self._make_request('DELETE', f"checklist/{checklist_id}/checklist_item/{item_id}")
+        if not success:
+            logger.error(f"Erro ao remover item do checklist: {response}")
+            return False, ""
+        return True, item_id
+    
+    def get_task_state(self, task_id: str) -> Tuple[bool, Dict]:
+        """Obtém o estado atual da tarefa (campos, checklist e subtarefas) em uma única requisição"""
+        success, response = self._make_request('GET', f"task/{task_id}?include_subtasks=true")
+        if not success:
+            logger.error(f"Erro ao obter tarefa {task_id}: {response}")
+            return False, {}
+        
+        # Usar o checklist de etapas criado pelo agente, ou o primeiro existente
+        checklist = None
+        checklists = response.get('checklists') or []
+        if checklists:
+            escolhido = next(
+                (c for c in checklists if str(c.get('name', '')).startswith('Etapas - ')),
+                checklists[0]
+            )
+            itens = sorted(escolhido.get('items') or [], key=lambda item: item.get('orderindex') or 0)
+            checklist = {
+                'id': escolhido['id'],
+                'name': escolhido.get('name', ''),
+                'items': [{'id': item['id'], 'name': item.get('name', '')} for item in itens]
+            }
+        
+        estado = {
+            'task_id': response['id'],
+            'list_id': (response.get('list') or {}).get('id'),
+            'name': response.get('name') or '',
+            'description': (response.get('description') or '').strip(),
+            'due_date': self._parse_due_date(response.get('due_date')),
+            'assignees': sorted(int(a['id']) for a in response.get('assignees') or []),
+            'tags': [str(t['name']).lower() for t in response.get('tags') or []],
+            'checklist': checklist,
+            'subtasks': [
+                {
+                    'id': sub['id'],
+                    'name': sub.get('name') or '',
+                    'due_date': self._parse_due_date(sub.get('due_date')),
+                    'assignees': sorted(int(a['id']) for a in sub.get('assignees') or [])
+                }
+                for sub in response.get('subtasks') or []
+            ]
+        }
+        return True, estado
+    
+    @staticmethod
+    def _parse_due_date(due_date: Any) -> Optional[int]:
+        """Converte o due_date da API (string em millisegundos ou null) para inteiro"""
+        if due_date in (None, ''):
+            return None
+        return int(due_date)
+    
+    def update_task(self, task_id: str, fields: Dict) -> Tuple[bool, str]:
+        """Atualiza apenas os campos informados de uma tarefa (PUT parcial)"""
+        success, response = self._make_request('PUT', f"task/{task_id}", fields)
+        if not success:
+            logger.error(f"Erro ao atualizar tarefa {task_id}: {response}")
+            return False, ""
+        logger.info(f"Tarefa atualizada com sucesso: {task_id}")
+        return True, task_id
+    
+    def delete_task(self, task_id: str) -> Tuple[bool, str]:
+        """Remove uma tarefa (ou subtarefa)"""
+        success, response = self._make_request('DELETE', f"task/{task_id}")
+        if not success:
+            logger.error(f"Erro ao remover tarefa {task_id}: {response}")
+            return False, ""
+        return True, task_id
+    
+    def add_tag(self, task_id: str, tag_name: str) -> Tuple[bool, str]:
+        """Adiciona uma tag à tarefa"""
+        success, response = self._make_request('POST', f"task/{task_id}/tag/{quote(tag_name, safe='')}")
+        if not success:
+            logger.error(f"Erro ao adicionar tag '{tag_name}': {response}")
+            return False, ""
+        return True, tag_name
+    
+    def remove_tag(self, task_id: str, tag_name: str) -> Tuple[bool, str]:
+        """Remove uma tag da tarefa"""
+        success, response = self._make_request('DELETE', f"task/{task_id}/tag/{quote(tag_name, safe='')}")
+        if not success:
+            logger.error(f"Erro ao remover tag '{tag_name}': {response}")
+            return False, ""
+        return True, tag_name
+    
+    def create_subtask(self, parent_task_id: str, subtask_data: Dict, list_id: Optional[str] = None) -> Tuple[bool, str]:
         """Cria uma subtarefa"""
         # Para criar subtarefa, usamos o mesmo endpoint de criar tarefa
         # mas com parent definido
         subtask_data['parent'] = parent_task_id
         
-        # Obter a lista da tarefa pai
-        success, parent_task = self._make_request('GET', f"task/{parent_task_id}")
-        if not success:
-            logger.error(f"Erro ao obter tarefa pai: {parent_task}")
-            return False, ""
-        
-        list_id = parent_task['list']['id']
+        # Obter a lista da tarefa pai (se ainda não conhecida)
+        if not list_id:
+            success, parent_task = self._make_request('GET', f"task/{parent_task_id}")
+            if not success:
+                logger.error(f"Erro ao obter tarefa pai: {parent_task}")
+                return False, ""
+            
+            list_id = parent_task['list']['id']
         
         success, response = self._make_request('POST', f"list/{list_id}/task", subtask_data)
         
@@ -350,6 +491,84 @@ def detectar_responsavel(texto: str) -> Optional[str]:
     
     return None
 
+def calcular_data_entrega(data: Dict[str, Any]) -> Optional[int]:
+    """Converte a data de entrega da demanda para timestamp em millisegundos"""
+    data_entrega = None
+    if 'data_hora_entrega' in data:
+        # Timestamp Unix em segundos
+        timestamp = int(data['data_hora_entrega'])
+        data_entrega = timestamp * 1000  # ClickUp usa millisegundos
+    elif 'data_entrega' in data:
+        # Formato de data string
+        try:
+            dt = datetime.strptime(data['data_entrega'], '%Y-%m-%d')
+            data_entrega = int(dt.timestamp() * 1000)
+        except ValueError:
+            logger.warning(f"Formato de data inválido: {data['data_entrega']}")
+    
+    return data_entrega
+
+def montar_descricao(tipo: str, equipe: str, hora: str, empresa: str, descricao: str = '') -> str:
+    """Monta a descrição padrão da tarefa principal"""
+    return f"""**Tipo:** {tipo.title()}
+**Equipe:** {equipe}
+**Horas Estimadas:** {hora}h
+**Empresa:** {empresa}
+
+{descricao or ''}""".strip()
+
+def extrair_campos_descricao(descricao: str) -> Dict[str, str]:
+    """Recupera tipo, equipe, hora, empresa e descrição livre de uma descrição gerada por montar_descricao"""
+    campos = {}
+    padroes = {
+        'tipo': r'^\*\*Tipo:\*\* (.*)$',
+        'equipe': r'^\*\*Equipe:\*\* (.*)$',
+        'hora': r'^\*\*Horas Estimadas:\*\* (.*?)h?$',
+        'empresa': r'^\*\*Empresa:\*\* (.*)$'
+    }
+    for campo, padrao in padroes.items():
+        match = re.search(padrao, descricao or '', re.MULTILINE)
+        if match:
+            campos[campo] = match.group(1).strip()
+    
+    if 'tipo' in campos:
+        campos['tipo'] = campos['tipo'].lower()
+    
+    # Descrição livre vem após a primeira linha em branco
+    partes = (descricao or '').split('\n\n', 1)
+    if len(campos) == len(padroes):
+        campos['descricao'] = partes[1].strip() if len(partes) > 1 else ''
+    
+    return campos
+
+def obter_estado_cache(task_id: str) -> Optional[Dict[str, Any]]:
+    """Retorna uma cópia do estado em cache da tarefa, se ainda válido"""
+    with _cache_lock:
+        entrada = CACHE_ESTADO_TAREFAS.get(task_id)
+        if not entrada:
+            return None
+        if time.time() - entrada['timestamp'] > CACHE_TTL_SEGUNDOS:
+            del CACHE_ESTADO_TAREFAS[task_id]
+            return None
+        return copy.deepcopy(entrada['estado'])
+
+def salvar_estado_cache(task_id: str, estado: Dict[str, Any]) -> None:
+    """Guarda o estado da tarefa no cache e descarta entradas expiradas"""
+    agora = time.time()
+    with _cache_lock:
+        expiradas = [
+            chave for chave, entrada in CACHE_ESTADO_TAREFAS.items()
+            if agora - entrada['timestamp'] > CACHE_TTL_SEGUNDOS
+        ]
+        for chave in expiradas:
+            del CACHE_ESTADO_TAREFAS[chave]
+        CACHE_ESTADO_TAREFAS[task_id] = {'estado': copy.deepcopy(estado), 'timestamp': agora}
+
+def invalidar_estado_cache(task_id: str) -> None:
+    """Remove a tarefa do cache (próxima atualização busca o estado no ClickUp)"""
+    with _cache_lock:
+        CACHE_ESTADO_TAREFAS.pop(task_id, None)
+
 def processar_demanda(data: Dict[str, Any]) -> Dict[str, Any]:
     """Processa uma demanda e cria no ClickUp"""
     try:
@@ -370,18 +589,7 @@ def processar_demanda(data: Dict[str, Any]) -> Dict[str, Any]:
         hora = data['hora']
         
         # Processar data de entrega
-        data_entrega = None
-        if 'data_hora_entrega' in data:
-            # Timestamp Unix em segundos
-            timestamp = int(data['data_hora_entrega'])
-            data_entrega = timestamp * 1000  # ClickUp usa millisegundos
-        elif 'data_entrega' in data:
-            # Formato de data string
-            try:
-                dt = datetime.strptime(data['data_entrega'], '%Y-%m-%d')
-                data_entrega = int(dt.timestamp() * 1000)
-            except ValueError:
-                logger.warning(f"Formato de data inválido: {data['data_entrega']}")
+        data_entrega = calcular_data_entrega(data)
         
         # Detectar responsável
         responsavel_id = None
@@ -418,12 +626,7 @@ def processar_demanda(data: Dict[str, Any]) -> Dict[str, Any]:
         # Preparar dados da tarefa principal (formato corrigido)
         task_data = {
             'name': tarefa,
-            'description': f"""**Tipo:** {tipo.title()}
-**Equipe:** {equipe}
-**Horas Estimadas:** {hora}h
-**Empresa:** {empresa}
-
-{data.get('descricao', '')}""".strip(),
+            'description': montar_descricao(tipo, equipe, hora, empresa, data.get('descricao', '')),
             'priority': 3,  # Prioridade normal
             'tags': data.get('tags', [])
         }
@@ -446,14 +649,19 @@ def processar_demanda(data: Dict[str, Any]) -> Dict[str, Any]:
         
         # Criar checklist
         checklist_id = None
+        checklist = None
         if checklist_items:
             checklist_name = f"Etapas - {tipo.title()}"
-            success, checklist_id = clickup.create_checklist(task_id, checklist_name, checklist_items)
-            if not success:
+            success, checklist = clickup.create_checklist(task_id, checklist_name, checklist_items)
+            if success:
+                checklist_id = checklist['id']
+            else:
+                checklist = None
                 logger.warning("Erro ao criar checklist")
         
         # Criar subtarefas
         subtask_ids = []
+        subtasks_estado = []
         for i, subtarefa in enumerate(subtarefas):
             subtask_data = {
                 'name': subtarefa,
@@ -469,12 +677,43 @@ def processar_demanda(data: Dict[str, Any]) -> Dict[str, Any]:
             if data_entrega:
                 subtask_data['due_date'] = data_entrega
             
-            success, subtask_id = clickup.create_subtask(task_id, subtask_data)
+            success, subtask_id = clickup.create_subtask(task_id, subtask_data, list_id)
             if success:
                 subtask_ids.append(subtask_id)
+                subtasks_estado.append({
+                    'id': subtask_id,
+                    'name': subtarefa,
+                    'due_date': subtask_data.get('due_date'),
+                    'assignees': subtask_data.get('assignees', [])
+                })
             else:
                 logger.warning(f"Erro ao criar subtarefa: {subtarefa}")
         
+        # Guardar estado criado para futuras atualizações diferenciais
+        # (apenas se tudo foi confirmado; senão a próxima atualização busca no ClickUp)
+        checklist_completo = not checklist_items or (
+            checklist is not None and len(checklist['items']) == len(checklist_items)
+        )
+        if checklist_completo and len(subtasks_estado) == len(subtarefas):
+            salvar_estado_cache(task_id, {
+                'task_id': task_id,
+                'list_id': list_id,
+                'name': str(tarefa)[:255],
+                'description': task_data['description'],
+                'due_date': task_data.get('due_date'),
+                'assignees': task_data.get('assignees', []),
+                'tags': [str(tag).lower() for tag in task_data['tags'] if tag] if isinstance(task_data['tags'], list) else [],
+                'checklist': checklist,
+                'subtasks': subtasks_estado,
+                'demanda': {
+                    'tipo': tipo,
+                    'equipe': equipe,
+                    'hora': hora,
+                    'empresa': empresa,
+                    'descricao': data.get('descricao', '')
+                }
+            })
+        
         # Resultado final
         resultado = {
             'success': True,
@@ -501,6 +740,376 @@ def processar_demanda(data: Dict[str, Any]) -> Dict[str, Any]:
             'error': f'Erro interno: {str(e)}'
         }
 
+def _reaproveitar_por_nome(atuais: List[Dict], nomes: List[str], novo: Callable[[str], Dict]) -> Tuple[List[Dict], bool]:
+    """Monta a lista desejada reaproveitando os elementos existentes com o mesmo nome.
+    
+    Os elementos mantidos ficam na ordem atual e os novos são adicionados ao
+    final, como o ClickUp faz ao criá-los. Retorna também se a ordem pedida
+    foi respeitada.
+    """
+    disponiveis = list(atuais)
+    mantidos = []
+    novos = []
+    for nome in nomes:
+        existente = next((item for item in disponiveis if item['name'] == nome), None)
+        if existente:
+            disponiveis.remove(existente)
+            mantidos.append(existente)
+        else:
+            novos.append(novo(nome))
+    
+    resultado = [copy.deepcopy(item) for item in atuais if any(item is m for m in mantidos)] + novos
+    return resultado, [item['name'] for item in resultado] == nomes
+
+def montar_estado_desejado(estado: Dict[str, Any], data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Aplica os campos informados na demanda sobre o estado atual da tarefa.
+    
+    Campos ausentes em `data` permanecem como estão no ClickUp.
+    """
+    desejado = copy.deepcopy(estado)
+    avisos = []
+    
+    # Descrição: combinar campos novos com os atuais (cache ou descrição existente)
+    campos_descricao = ('tipo', 'equipe', 'hora', 'empresa', 'descricao')
+    demanda_atual = estado.get('demanda') or extrair_campos_descricao(estado['description'])
+    demanda = dict(demanda_atual)
+    for campo in campos_descricao:
+        if campo in data:
+            demanda[campo] = str(data[campo] or '')
+    if demanda.get('tipo'):
+        demanda['tipo'] = demanda['tipo'].lower()
+    
+    tipo_anterior = demanda_atual.get('tipo')
+    tipo = demanda.get('tipo') or tipo_anterior
+    
+    if all(demanda.get(campo) for campo in ('tipo', 'equipe', 'hora', 'empresa')):
+        desejado['demanda'] = demanda
+        if any(campo in data for campo in campos_descricao):
+            desejado['description'] = montar_descricao(
+                demanda['tipo'], demanda['equipe'], demanda['hora'], demanda['empresa'], demanda.get('descricao', '')
+            )
+    elif any(campo in data for campo in campos_descricao):
+        avisos.append('Descrição não atualizada: tipo, equipe, hora e empresa não puderam ser determinados')
+    
+    if data.get('empresa') and demanda_atual.get('empresa') and data['empresa'] != demanda_atual['empresa']:
+        avisos.append('Mudança de empresa altera apenas a descrição; a tarefa permanece na lista original')
+    
+    # Nome
+    if data.get('tarefa'):
+        desejado['name'] = str(data['tarefa'])[:255]
+    
+    # Data de entrega (valor vazio remove o prazo)
+    if 'data_hora_entrega' in data or 'data_entrega' in data:
+        if not data.get('data_hora_entrega', data.get('data_entrega')):
+            desejado['due_date'] = None
+        else:
+            data_entrega = calcular_data_entrega(data)
+            if data_entrega:
+                desejado['due_date'] = data_entrega
+            else:
+                avisos.append('Data de entrega não atualizada: formato inválido')
+    
+    # Responsável (valor vazio remove o responsável)
+    if 'responsavel' in data:
+        responsavel_nome = str(data['responsavel'] or '').lower()
+        if not responsavel_nome:
+            desejado['assignees'] = []
+        elif responsavel_nome in RESPONSAVEIS:
+            desejado['assignees'] = [int(RESPONSAVEIS[responsavel_nome])]
+        else:
+            avisos.append(f"Responsável não reconhecido: {data['responsavel']}")
+    
+    # Tags
+    if 'tags' in data:
+        tags = data['tags'] if isinstance(data['tags'], list) else []
+        desejado['tags'] = list(dict.fromkeys(str(tag).lower() for tag in tags if tag))
+    
+    # Checklist: mudança de tipo só renomeia; itens mudam apenas com lista explícita
+    checklist_atual = estado['checklist']
+    if desejado['checklist'] and tipo_anterior and tipo != tipo_anterior and desejado['checklist']['name'].startswith('Etapas - '):
+        desejado['checklist']['name'] = f"Etapas - {tipo.title()}"
+    
+    if 'checklist' in data:
+        nomes_itens = [str(item) for item in data['checklist'] or [] if item]
+        if desejado['checklist'] is None and nomes_itens:
+            desejado['checklist'] = {
+                'id': None,
+                'name': f"Etapas - {(tipo or 'default').title()}",
+                'items': []
+            }
+        if desejado['checklist'] is not None:
+            desejado['checklist']['items'], ordem_aplicada = _reaproveitar_por_nome(
+                checklist_atual['items'] if checklist_atual else [],
+                nomes_itens,
+                lambda nome: {'id': None, 'name': nome}
+            )
+            if not ordem_aplicada:
+                avisos.append('Ordem do checklist não aplicada: itens existentes mantêm a posição e novos vão para o final')
+    
+    # Subtarefas: alteradas apenas com lista explícita
+    if 'subtarefas' in data:
+        nomes_subtarefas = [str(sub) for sub in data['subtarefas'] or [] if sub]
+        desejado['subtasks'], ordem_aplicada = _reaproveitar_por_nome(
+            estado['subtasks'],
+            nomes_subtarefas,
+            lambda nome: {
+                'id': None,
+                'name': nome,
+                'due_date': desejado['due_date'],
+                'assignees': list(desejado['assignees'])
+            }
+        )
+        if not ordem_aplicada:
+            avisos.append('Ordem das subtarefas não aplicada: subtarefas existentes mantêm a posição e novas vão para o final')
+    
+    # Subtarefas que herdavam prazo/responsável da principal acompanham a mudança
+    for sub in desejado['subtasks']:
+        if not sub['id']:
+            continue
+        if sub['due_date'] == estado['due_date']:
+            sub['due_date'] = desejado['due_date']
+        if sorted(sub['assignees']) == sorted(estado['assignees']):
+            sub['assignees'] = list(desejado['assignees'])
+    
+    return desejado, avisos
+
+def calcular_campos_alterados(atual: Dict[str, Any], desejado: Dict[str, Any]) -> Dict[str, Any]:
+    """Retorna apenas os campos que precisam ir no PUT da tarefa"""
+    campos = {}
+    for campo in ('name', 'description', 'due_date'):
+        if campo in desejado and desejado[campo] != atual.get(campo):
+            campos[campo] = desejado[campo]
+    
+    # Responsáveis usam o formato add/rem do ClickUp
+    adicionar = sorted(set(desejado['assignees']) - set(atual['assignees']))
+    remover = sorted(set(atual['assignees']) - set(desejado['assignees']))
+    if adicionar or remover:
+        campos['assignees'] = {'add': adicionar, 'rem': remover}
+    
+    return campos
+
+def planejar_operacoes(clickup: ClickUpAPI, estado: Dict[str, Any], desejado: Dict[str, Any]) -> List[List[Tuple[str, Callable[[], Tuple[bool, Any]]]]]:
+    """Gera as requisições mínimas para levar a tarefa do estado atual ao desejado.
+    
+    Cada grupo é executado em sequência; grupos distintos são independentes
+    e podem rodar em paralelo. Criações de itens e subtarefas ficam no mesmo
+    grupo para preservar a ordem.
+    """
+    grupos = []
+    task_id = estado['task_id']
+    
+    # Tarefa principal: um único PUT com os campos alterados
+    campos = calcular_campos_alterados(estado, desejado)
+    if campos:
+        grupos.append([(
+            f"Atualizar tarefa ({', '.join(campos)})",
+            lambda: clickup.update_task(task_id, campos)
+        )])
+    
+    # Tags
+    for tag in desejado['tags']:
+        if tag not in estado['tags']:
+            grupos.append([(f"Adicionar tag '{tag}'", lambda tag=tag: clickup.add_tag(task_id, tag))])
+    for tag in estado['tags']:
+        if tag not in desejado['tags']:
+            grupos.append([(f"Remover tag '{tag}'", lambda tag=tag: clickup.remove_tag(task_id, tag))])
+    
+    # Checklist
+    checklist_atual = estado['checklist']
+    checklist_desejado = desejado['checklist']
+    if checklist_desejado:
+        sequencia = []
+        if not checklist_desejado['id']:
+            def criar_checklist():
+                success, checklist = clickup.create_checklist(task_id, checklist_desejado['name'], [])
+                if success:
+                    checklist_desejado['id'] = checklist['id']
+                return success, checklist.get('id', '')
+            sequencia.append((f"Criar checklist '{checklist_desejado['name']}'", criar_checklist))
+        elif checklist_atual and checklist_desejado['name'] != checklist_atual['name']:
+            grupos.append([(
+                f"Renomear checklist para '{checklist_desejado['name']}'",
+                lambda: clickup.update_checklist(checklist_desejado['id'], checklist_desejado['name'])
+            )])
+        
+        for item in checklist_desejado['items']:
+            if item['id']:
+                continue
+            def adicionar_item(item=item):
+                success, item_id = clickup.add_checklist_item(checklist_desejado['id'], item['name'])
+                if success:
+                    item['id'] = item_id
+                return success, item_id
+            sequencia.append((f"Adicionar item '{item['name']}' ao checklist", adicionar_item))
+        
+        if sequencia:
+            grupos.append(sequencia)
+        
+        if checklist_atual:
+            mantidos = {item['id'] for item in checklist_desejado['items'] if item['id']}
+            for item in checklist_atual['items']:
+                if item['id'] not in mantidos:
+                    grupos.append([(
+                        f"Remover item '{item['name']}' do checklist",
+                        lambda item=item: clickup.delete_checklist_item(checklist_atual['id'], item['id'])
+                    )])
+    
+    # Subtarefas
+    subtarefas_atuais = {sub['id']: sub for sub in estado['subtasks']}
+    mantidas = {sub['id'] for sub in desejado['subtasks'] if sub['id']}
+    for sub in estado['subtasks']:
+        if sub['id'] not in mantidas:
+            grupos.append([(f"Remover subtarefa '{sub['name']}'", lambda sub=sub: clickup.delete_task(sub['id']))])
+    
+    sequencia = []
+    for i, sub in enumerate(desejado['subtasks']):
+        if sub['id']:
+            campos_sub = calcular_campos_alterados(subtarefas_atuais[sub['id']], sub)
+            if campos_sub:
+                grupos.append([(
+                    f"Atualizar subtarefa '{sub['name']}' ({', '.join(campos_sub)})",
+                    lambda sub=sub, campos_sub=campos_sub: clickup.update_task(sub['id'], campos_sub)
+                )])
+            continue
+        
+        def criar_subtarefa(sub=sub, i=i):
+            subtask_data = {
+                'name': sub['name'],
+                'description': f"Subtarefa {i+1} da tarefa principal: {desejado['name']}",
+                'priority': 3
+            }
+            if sub['assignees']:
+                subtask_data['assignees'] = list(sub['assignees'])
+            if sub['due_date']:
+                subtask_data['due_date'] = sub['due_date']
+            success, subtask_id = clickup.create_subtask(task_id, subtask_data, estado['list_id'])
+            if success:
+                sub['id'] = subtask_id
+            return success, subtask_id
+        sequencia.append((f"Criar subtarefa '{sub['name']}'", criar_subtarefa))
+    
+    if sequencia:
+        grupos.append(sequencia)
+    
+    return grupos
+
+def executar_operacoes(grupos: List[List[Tuple[str, Callable[[], Tuple[bool, Any]]]]]) -> List[Dict[str, Any]]:
+    """Executa os grupos de operações em paralelo (cada grupo em sequência)"""
+    def executar_sequencia(grupo):
+        resultados = []
+        for descricao, operacao in grupo:
+            try:
+                success, _ = operacao()
+            except Exception as e:
+                logger.error(f"Erro em '{descricao}': {str(e)}")
+                success = False
+            resultados.append({'operacao': descricao, 'success': success})
+            if not success:
+                # As operações seguintes do grupo dependem desta
+                break
+        return resultados
+    
+    if not grupos:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(MAX_REQUISICOES_PARALELAS, len(grupos))) as executor:
+        return [resultado for resultados in executor.map(executar_sequencia, grupos) for resultado in resultados]
+
+def atualizar_demanda(task_id: str, data: Dict[str, Any], forcar_busca: bool = False) -> Dict[str, Any]:
+    """Atualiza uma demanda existente enviando apenas as diferenças ao ClickUp.
+    
+    Quando o estado vem do cache e o diff falha ou não encontra nada a fazer,
+    o estado é buscado novamente no ClickUp e o diff refeito uma única vez
+    (a tarefa pode ter sido alterada fora do agente).
+    """
+    alteracoes = []
+    avisos = []
+    requisicoes = 0
+    try:
+        clickup = ClickUpAPI()
+        
+        # Estado atual: cache (sem requisição) ou uma única busca no ClickUp
+        estado = None if forcar_busca else obter_estado_cache(task_id)
+        estado_em_cache = estado is not None
+        
+        while True:
+            if estado is None:
+                success, estado = clickup.get_task_state(task_id)
+                requisicoes += 1
+                if not success:
+                    return {
+                        'success': False,
+                        'error': 'Erro ao obter estado atual da tarefa',
+                        'data': {
+                            'task_id': task_id,
+                            'alteracoes': alteracoes,
+                            'avisos': avisos,
+                            'requisicoes': requisicoes
+                        }
+                    }
+            
+            desejado, avisos = montar_estado_desejado(estado, data)
+            grupos = planejar_operacoes(clickup, estado, desejado)
+            resultados = executar_operacoes(grupos)
+            
+            alteracoes += [r['operacao'] for r in resultados if r['success']]
+            falhas = [r['operacao'] for r in resultados if not r['success']]
+            requisicoes += len(resultados)
+            
+            if not estado_em_cache or not (falhas or not resultados):
+                break
+            
+            # Cache possivelmente desatualizado (ex.: id removido ou campo alterado no ClickUp)
+            logger.info(f"Revalidando estado da tarefa {task_id} no ClickUp")
+            invalidar_estado_cache(task_id)
+            estado = None
+            estado_em_cache = False
+        
+        if falhas:
+            # Estado parcial: forçar nova busca na próxima atualização
+            invalidar_estado_cache(task_id)
+            logger.error(f"Falhas ao atualizar demanda {task_id}: {falhas}")
+            return {
+                'success': False,
+                'error': 'Erro ao aplicar parte das alterações',
+                'data': {
+                    'task_id': task_id,
+                    'alteracoes': alteracoes,
+                    'falhas': falhas,
+                    'avisos': avisos,
+                    'requisicoes': requisicoes
+                }
+            }
+        
+        salvar_estado_cache(task_id, desejado)
+        
+        logger.info(f"Demanda {task_id} atualizada com {requisicoes} requisição(ões)")
+        return {
+            'success': True,
+            'message': 'Demanda atualizada com sucesso!' if alteracoes else 'Nenhuma alteração necessária',
+            'data': {
+                'task_id': task_id,
+                'alteracoes': alteracoes,
+                'avisos': avisos,
+                'requisicoes': requisicoes,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }
+        }
+        
+    except Exception as e:
+        invalidar_estado_cache(task_id)
+        logger.error(f"Erro ao atualizar demanda {task_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': f'Erro interno: {str(e)}',
+            'data': {
+                'task_id': task_id,
+                'alteracoes': alteracoes,
+                'avisos': avisos,
+                'requisicoes': requisicoes
+            }
+        }
+
 # Rotas da API
 @app.route('/', methods=['GET'])
 def home():
@@ -511,6 +1120,7 @@ def home():
         'endpoints': {
             '/health': 'Verificação de saúde',
             '/webhook/demand': 'Criação de demandas',
+            '/webhook/demand/<task_id>': 'Atualização diferencial de demandas',
             '/responsaveis': 'Lista de responsáveis',
             '/config': 'Configuração do sistema'
         },
@@ -566,6 +1176,47 @@ def webhook_demand():
             'error': f'Erro interno: {str(e)}'
         }), 500
 
+@app.route('/webhook/demand/<task_id>', methods=['PUT', 'POST'])
+def webhook_demand_update(task_id: str):
+    """Endpoint para correções em uma demanda existente (atualização diferencial)"""
+    try:
+        # Verificar se é JSON
+        if not request.is_json:
+            return jsonify({
+                'success': False,
+                'error': 'Content-Type deve ser application/json'
+            }), 400
+        
+        # Obter dados
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'Dados JSON inválidos'
+            }), 400
+        
+        # ?refresh=true ignora o cache e busca o estado atual no ClickUp
+        forcar_busca = request.args.get('refresh', '').lower() in ('1', 'true', 'sim')
+        
+        logger.info(f"Recebida atualização para {task_id}: {json.dumps(data, indent=2)}")
+        
+        # Atualizar demanda
+        resultado = atualizar_demanda(task_id, data, forcar_busca)
+        
+        # Retornar resultado
+        if resultado['success']:
+            return jsonify(resultado), 200
+        else:
+            return jsonify(resultado), 400
+            
+    except Exception as e:
+        logger.error(f"Erro no webhook de atualização: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Erro interno: {str(e)}'
+        }), 500
+
 @app.route('/responsaveis', methods=['GET'])
 def listar_responsaveis():
     """Lista responsáveis disponíveis"""